@@ -2,139 +2,114 @@
 
 import argparse
 import random
-from time import sleep
+from time import monotonic, sleep
 import sys
-from enum import Enum
-from functools import total_ordering
-from typing import List
+from enum import IntEnum
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Tuple
 
 
-############
-# Utils
-############
-
-def applyNTimes(f, x, n):
-    state = x
-    for i in range(n):
-        state = f(state)
-    return state
-
-# from https://docs.python.org/3.10/library/enum.html#orderedenum
-class OrderedEnum(Enum):
-    def __ge__(self, other):
-        if self.__class__ is other.__class__:
-            return self.value >= other.value
-        return NotImplemented
-    def __gt__(self, other):
-        if self.__class__ is other.__class__:
-            return self.value > other.value
-        return NotImplemented
-    def __le__(self, other):
-        if self.__class__ is other.__class__:
-            return self.value <= other.value
-        return NotImplemented
-    def __lt__(self, other):
-        if self.__class__ is other.__class__:
-            return self.value < other.value
-        return NotImplemented
-
 # symbols: ♭ ♮ ♯
 
-class Accidental(OrderedEnum):
+class Accidental(IntEnum):
     flat = 0
     natural = 1
     sharp = 2
 
     def __str__(self):
-        match self:
-            case Accidental.flat:
-                return "♭"
-            case Accidental.natural:
-                return "♮"
-            case Accidental.sharp:
-                return "♯"
+        return _ACC_STR[self]
 
     def str_omit_natural(self):
-        if self == Accidental.natural:
-            return ""
-        else:
-            return str(self)
+        return _ACC_OMIT[self]
 
     @classmethod
     def from_string(cls, string):
-        match string:
-            case "♭":
-                return Accidental.flat
-            case "b":
-                return Accidental.flat
-            case "♮":
-                return Accidental.natural
-            case "♯":
-                return Accidental.sharp
-            case "#":
-                return Accidental.sharp
-            case other:
-                raise ValueError("Invalid accidental symbol. String must be a single character, one of '♭', '♮', or '♯'")
-
-''' handles G -> A.
-    Assumes the argument is a single letter in uppercase, that is a valid note letter
-'''
-def next_letter(letter):
-    if letter == "G":
-        return "A"
-    else:
-        return chr(ord(letter) + 1)
-
+        try:
+            return _ACC_FROM[string]
+        except KeyError:
+            raise ValueError("Invalid accidental symbol. String must be a single character, one of '♭', '♮', or '♯'") from None
+
+_ACC_STR = {Accidental.flat: "♭", Accidental.natural: "♮", Accidental.sharp: "♯"}
+_ACC_OMIT = _ACC_STR | {Accidental.natural: ""}
+_ACC_FROM = {
+        "♭": Accidental.flat,
+        "b": Accidental.flat,
+        "♮": Accidental.natural,
+        "♯": Accidental.sharp,
+        "#": Accidental.sharp,
+        }
+
+_NOTE_CACHE = {}
 
 ''' A musical note.
 
     NOTE this will not behave correctly in the presence of B#, Cb, E#, or Fb. Also does not handle double sharps or double flats.
+
+    Notes are interned: constructing the same (letter, accidental) twice
+    returns the same object, so equality and hashing are by identity.
 '''
-@total_ordering
 class Note:
-    def __init__(self, letter, accidental=Accidental.natural):
+    __slots__ = ('letter', 'accidental', 'pitch_class', '_key', '_display')
+
+    def __new__(cls, letter, accidental=Accidental.natural):
         letter = letter.upper()
-        if letter not in LETTER_NOTES:
+        if letter not in LETTER_PITCH_CLASSES:
             raise ValueError("Invalid note letter")
+        return cls._new_unchecked(letter, accidental)
+
+    # For internal use. Skips normalising and validating the letter, so it
+    # must already be a valid uppercase note letter.
+    @classmethod
+    def _new_unchecked(cls, letter, accidental):
+        try:
+            return _NOTE_CACHE[letter, accidental]
+        except KeyError:
+            pass
+        self = super().__new__(cls)
         self.letter = letter
         self.accidental = accidental
+        # flat is -1, natural is 0, sharp is +1
+        self.pitch_class = (LETTER_PITCH_CLASSES[letter] + accidental.value - 1) % 12
+        self._key = (letter, accidental)
+        self._display = letter + accidental.str_omit_natural()
+        _NOTE_CACHE[letter, accidental] = self
+        return self
+
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
 
-    def __eq__(self, other):
-        return (self.letter, self.accidental) == (other.letter, other.accidental)
+    # so that copying and unpickling go through the cache too
+    def __reduce__(self):
+        return (Note, (self.letter, self.accidental))
 
     def __lt__(self, other):
-        return (self.letter, self.accidental) < (other.letter, other.accidental)
+        return self._key < other._key
 
-    def __key(self):
-        return (self.letter, self.accidental)
+    def __le__(self, other):
+        return self._key <= other._key
+
+    def __gt__(self, other):
+        return self._key > other._key
 
-    def __hash__(self):
-        return hash(self.__key())
+    def __ge__(self, other):
+        return self._key >= other._key
 
     def __str__(self):
         return self.letter + str(self.accidental)
 
     def str_omit_natural(self):
-        return self.letter + self.accidental.str_omit_natural()
+        return self._display
 
     # only returns sharps for now.
     def semitone_above(self):
-        match self.accidental:
-            case Accidental.natural:
-                if self.letter not in CANT_BE_SHARP:
-                    return Note(self.letter, Accidental.sharp)
-                else:
-                    # either B -> C or E -> F. Don't need to worry about 
-                    # looping, that only happens at G -> A
-                    return Note(next_letter(self.letter), Accidental.natural)
-            case Accidental.sharp:
-                # assumes we're not incrementing an invalid note eg B#.
-                return Note(next_letter(self.letter), Accidental.natural)
-            case Accidental.flat:
-                return Note(self.letter, Accidental.natural)
+        return Note.from_pitch_class(self.pitch_class + 1)
 
     def semitones_above(self, n):
-        return applyNTimes(lambda note: note.semitone_above(), self, n)
+        # keep the spelling of the note itself, eg D♭ stays D♭
+        if n == 0:
+            return self
+        return Note.from_pitch_class(self.pitch_class + n)
 
     def tone_above(self):
         return self.semitones_above(2)
@@ -152,54 +127,135 @@ class Note:
             case other:
                 raise ValueError("Invalid note string.")
 
-# for now these only work with sharps
-def major_scale(tonic: Note) -> List[Note]:
-    return [ tonic,
-              tonic.semitones_above(2),
-              tonic.semitones_above(4),
-              tonic.semitones_above(5),
-              tonic.semitones_above(7),
-              tonic.semitones_above(9),
-              tonic.semitones_above(11),
-            ]
+    # spells the note with sharps
+    @classmethod
+    def from_pitch_class(cls, pitch_class):
+        return SHARP_NOTES[pitch_class % 12]
 
-def natural_minor_scale(tonic: Note) -> List[Note]:
-    return [ tonic,
-              tonic.semitones_above(2),
-              tonic.semitones_above(3),
-              tonic.semitones_above(5),
-              tonic.semitones_above(7),
-              tonic.semitones_above(8),
-              tonic.semitones_above(10),
-            ]
+# Scales are lists of pitch classes, ie integers in [0, 12) where C is 0.
+def scale_pitch_classes(tonic: int, steps) -> List[int]:
+    return [(tonic + step) % 12 for step in steps]
+
+def major_scale(tonic: int) -> List[int]:
+    return scale_pitch_classes(tonic, MAJOR_STEPS)
+
+def natural_minor_scale(tonic: int) -> List[int]:
+    return scale_pitch_classes(tonic, NATURAL_MINOR_STEPS)
+
+# Scales are only built when asked for, since the CLI only ever uses one.
+# Assumes the name is in SCALE_NAMES.
+def scale_pitch_classes_by_name(name: str) -> List[int]:
+    if name == "chromatic":
+        return list(range(12))
+    [tonic, quality] = name.split()
+    return SCALE_QUALITIES[quality](LETTER_PITCH_CLASSES[tonic])
+
+# the display strings of the scale's notes, ready to print
+@lru_cache(maxsize=None)
+def get_scale(name: str) -> Tuple[str, ...]:
+    if name == "chromatic":
+        return tuple(note.str_omit_natural() for note in ALL_NOTES)
+    # a single gather; scales always have more than one note, so this
+    # returns a tuple
+    return itemgetter(*scale_pitch_classes_by_name(name))(SHARP_NAMES)
+
+@lru_cache(maxsize=None)
+def get_scale_mask(name: str) -> int:
+    return scale_mask(scale_pitch_classes_by_name(name))
+
+# Returns the name in SCALE_NAMES that the user meant, eg "C  MIN" -> "C minor".
+# Unknown names are returned unchanged, and handled in main.
+def resolve_scale_name(name: str) -> str:
+    return SCALE_ALIASES.get(" ".join(name.lower().split()), name)
+
+# A scale can also be stored as a 12 bit mask, where bit n is set if pitch
+# class n is in the scale. eg C major is 0b101010110101.
+def scale_mask(pitch_classes) -> int:
+    return sum(1 << pc for pc in set(pitch_classes))
+
+def in_scale(mask: int, pitch_class: int) -> bool:
+    return bool((mask >> pitch_class) & 1)
+
+# transposes up by n semitones, by rotating the 12 bits left
+def transpose(mask: int, n: int) -> int:
+    n %= 12
+    return ((mask << n) | (mask >> (12 - n))) & 0xFFF
 
 ############
 # CONSTANTS
 ############
 
 LETTER_NOTES = list("CDEFGAB")
-
-# technically they can be, but it's less annoying to just use the enharmonic equivalent
-CANT_BE_SHARP = set("BE")
-CANT_BE_FLAT  = set("CF")
-
-ALL_NOTES_SHARPS = sorted(
-        [Note(letter, Accidental.natural) for letter in LETTER_NOTES] +
-        [Note(letter, Accidental.sharp)
-            for letter in LETTER_NOTES if letter not in CANT_BE_SHARP])
-
-ALL_NOTES_FLATS = sorted(
-        [Note(letter, Accidental.natural) for letter in LETTER_NOTES] +
-        [Note(letter, Accidental.flat) 
-            for letter in LETTER_NOTES if letter not in CANT_BE_FLAT])
+LETTER_PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+# indexed by pitch class
+SHARP_NAMES = ("C", "C♯", "D", "D♯", "E", "F", "F♯", "G", "G♯", "A", "A♯", "B")
+
+# semitones above the tonic
+MAJOR_STEPS         = (0, 2, 4, 5, 7, 9, 11)
+NATURAL_MINOR_STEPS = (0, 2, 3, 5, 7, 8, 10)
+
+_FLAT, _NAT, _SHARP = Accidental.flat, Accidental.natural, Accidental.sharp
+_note = Note._new_unchecked
+
+# lookup table for Note.from_pitch_class
+SHARP_NOTES = tuple(_note(name[0], _SHARP if len(name) == 2 else _NAT) for name in SHARP_NAMES)
+
+# Ordered by letter, then accidental.
+# There's no B♯, E♯, C♭ or F♭. Technically they exist, but it's less annoying
+# to just use the enharmonic equivalent.
+ALL_NOTES_SHARPS = (
+        _note("A", _NAT), _note("A", _SHARP),
+        _note("B", _NAT),
+        _note("C", _NAT), _note("C", _SHARP),
+        _note("D", _NAT), _note("D", _SHARP),
+        _note("E", _NAT),
+        _note("F", _NAT), _note("F", _SHARP),
+        _note("G", _NAT), _note("G", _SHARP),
+        )
+
+ALL_NOTES_FLATS = (
+        _note("A", _FLAT), _note("A", _NAT),
+        _note("B", _FLAT), _note("B", _NAT),
+        _note("C", _NAT),
+        _note("D", _FLAT), _note("D", _NAT),
+        _note("E", _FLAT), _note("E", _NAT),
+        _note("F", _NAT),
+        _note("G", _FLAT), _note("G", _NAT),
+        )
 
 # includes notes that are enharmonically equivalent, eg C♯ and D♭
-ALL_NOTES = sorted(set(ALL_NOTES_SHARPS) | set(ALL_NOTES_FLATS))
+ALL_NOTES = (
+        _note("A", _FLAT), _note("A", _NAT), _note("A", _SHARP),
+        _note("B", _FLAT), _note("B", _NAT),
+        _note("C", _NAT), _note("C", _SHARP),
+        _note("D", _FLAT), _note("D", _NAT), _note("D", _SHARP),
+        _note("E", _FLAT), _note("E", _NAT),
+        _note("F", _NAT), _note("F", _SHARP),
+        _note("G", _FLAT), _note("G", _NAT), _note("G", _SHARP),
+        )
 
 # todo: support tonics on accidentals
-MAJOR_SCALES = {tonic + " major": major_scale(Note(tonic)) for tonic in LETTER_NOTES}
-NATURAL_MINOR_SCALES = {tonic + " minor": natural_minor_scale(Note(tonic)) for tonic in LETTER_NOTES}
-SCALES = {"chromatic": ALL_NOTES} | MAJOR_SCALES | NATURAL_MINOR_SCALES
+SCALE_QUALITIES = {"major": major_scale, "minor": natural_minor_scale}
+SCALE_NAMES = ("chromatic",) + tuple(f"{tonic} {quality}"
+                                     for quality in SCALE_QUALITIES
+                                     for tonic in LETTER_NOTES)
+
+# the ways a user can spell each quality. "c" means C major, "cm" C minor.
+QUALITY_ALIASES = {
+        "": "major", "maj": "major", "major": "major",
+        "m": "minor", "min": "minor", "minor": "minor",
+        }
+
+# TODO write a proper datatype and parser for scales
+# Maps every accepted lowercase spelling of a scale name, eg "f", "fm",
+# "f major", "f min", to its name in SCALE_NAMES.
+SCALE_ALIASES = {"chromatic": "chromatic"} | {
+        letter.lower() + separator + alias: f"{letter} {quality}"
+        for letter in LETTER_NOTES
+        for alias, quality in QUALITY_ALIASES.items()
+        for separator in ("", " ") if alias or not separator
+        }
 
 def quick_dirty_test_semitone_above():
     cases = [
@@ -215,23 +271,24 @@ def quick_dirty_test_semitone_above():
         (note, expected) = Note.from_string(note), Note.from_string(expected)
         assert note.semitone_above() == expected
 
-# TODO write a proper datatype and parser for scales
-def normalize_scale_name(name: str) -> str:
-    if name == "chromatic":
-        return name
-    else:
-        if len(name) == 1:
-            return name.upper() + " " + "major"
-        elif len(name) == 2 and name[1] == "m":
-            return name[0].upper() + " " + "minor"
-        else:
-            # eg "f major", "F major", "c minor"
-            try:
-                [letter, quality] = name.split()
-            except ValueError as e:
-                # the name is invalid - this will be handled in main
-                return name
-            return " ".join([letter.upper(), quality])
+def quick_dirty_test_scale_masks():
+    c_major = get_scale_mask("C major")
+    assert transpose(c_major, 2) == get_scale_mask("D major")
+    assert transpose(c_major, 0) == c_major
+    assert in_scale(c_major, LETTER_PITCH_CLASSES["E"])
+    assert not in_scale(c_major, Note.from_string("F#").pitch_class)
+
+def quick_dirty_test_resolve_scale_name():
+    cases = [
+            ("c", "C major"),
+            ("cm", "C minor"),
+            ("c  major", "C major"),
+            ("C MIN", "C minor"),
+            ("h major", "h major"),
+            ]
+
+    for (name, expected) in cases:
+        assert resolve_scale_name(name) == expected
 
 
 def main():
@@ -241,23 +298,39 @@ def main():
     parser.add_argument('-s', '--scale', type=str, default="chromatic")
 
     args = parser.parse_args()
-    args.scale = args.scale.lower()
-    args.scale = normalize_scale_name(args.scale)
+    if args.time <= 0:
+        parser.error("--time must be a positive number of seconds")
+    args.scale = resolve_scale_name(args.scale)
 
     # todo: scales starting on accidentals
-    if args.scale in SCALES:
-        scale = SCALES[args.scale]
+    if args.scale in SCALE_NAMES:
+        scale = get_scale(args.scale)
     else:
         print("Sorry, I don't know about that scale yet. Here are the scales I know about:")
-        for k in SCALES:
+        for k in SCALE_NAMES:
             print("- " + k)
         sys.exit()
 
     print(f"Choosing a random note from the {args.scale} scale every {args.time} seconds.")
+    # bound to locals to save the global and attribute lookups on each tick
+    choice = random.Random().choice
+    write = sys.stdout.write
+    flush = sys.stdout.flush
+    interval = args.time
+    # sleep until a fixed deadline rather than for a fixed time, so the
+    # time spent printing doesn't accumulate as drift
+    deadline = monotonic()
     while True:
-        print(random.choice(scale).str_omit_natural())
-        print("")
-        sleep(args.time)
+        write(choice(scale))
+        write("\n\n")
+        flush()
+        deadline += interval
+        now = monotonic()
+        # if we fell behind (eg the process was suspended), skip the missed
+        # ticks rather than printing a burst of notes to catch up
+        if deadline < now:
+            deadline = now
+        sleep(deadline - now)
 
 
 if __name__ == '__main__':